@@ -2,15 +2,24 @@
 import streamlit as st
 from streamlit_js_eval import streamlit_js_eval
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
 from datetime import datetime, timedelta, date
 import time
 import numpy as np # Import de NumPy pour les opérations vectorielles
 import random 
 from geopy.geocoders import Nominatim 
-import plotly.express as px
+from geopy.adapters import RequestsAdapter
+from functools import partial
 import plotly.graph_objects as px_go
 import math
+import os
+import dbm
+import hashlib
+import json
+import re
+import threading
+import unicodedata
 
 # --- FONCTIONS LOCALES POUR LES BOUTONS ---
 def generate_pdf():
@@ -35,15 +44,33 @@ ISS_PASS_API_URL = "http://api.open-notify.org/iss-pass.json"
 DEFAULT_LAT = 48.8566  # Paris
 DEFAULT_LON = 2.3522   # Paris
 MAX_PASSES = 100       # Nombre de passages à demander (Open-Notify max 100, soit environ 10-15 jours)
+HTTP_POOL_SIZE = 4     # Connexions HTTP persistantes (keep-alive) conservées par hôte
+# Cache disque (dbm) des géocodages, conservé entre redémarrages : à côté du script,
+# ou dans le dossier indiqué par la variable d'environnement ISS_CACHE_DIR
+GEOCODE_CACHE_DIR = os.environ.get("ISS_CACHE_DIR", os.path.dirname(os.path.abspath(__file__)))
+GEOCODE_CACHE_FILE = os.path.join(GEOCODE_CACHE_DIR, "geocode_cache")
+GEOCODE_CACHE_TTL = 86400             # Durée du cache mémoire des géocodages (24 heures)
+GEOCODE_DISK_CACHE_TTL = 30 * 86400   # Durée de validité d'une entrée du cache disque (30 jours)
 
 # Constantes de Scoring pour la classification des passages
 SCORE_VISIBILITY_OPTIMAL = 10
 SCORE_WEATHER_DEGAGE = 5  # Score augmenté pour donner plus de poids à la météo idéale
 SCORE_WEATHER_PEU_NUAGEUX = 1
 
-# Initialisation du service de géocodage Nominatim (utilisé pour geopy)
-# Utiliser un agent utilisateur unique est une bonne pratique
-geolocator = Nominatim(user_agent="iss_predictor_pro_app")
+# Conditions météo simulées et leur distribution de probabilité
+WEATHER_CATEGORIES = np.array(["Ciel Dégagé", "Peu Nuageux", "Couvert", "Pluvieux"])
+WEATHER_PROBS = [0.5, 0.2, 0.2, 0.1]
+# Distribution cumulée précalculée une fois (dernière borne forcée à 1.0 contre les arrondis)
+WEATHER_CDF = np.append(np.cumsum(WEATHER_PROBS[:-1]), 1.0)
+# Score météo aligné sur l'ordre de WEATHER_CATEGORIES (Couvert et Pluvieux : 0, peut être 0 ou négatif)
+WEATHER_SCORES = [SCORE_WEATHER_DEGAGE, SCORE_WEATHER_PEU_NUAGEUX, 0, 0]
+
+# Catégories de visibilité ISS (l'ordre fixe les codes : 0 = Optimale)
+VISIBILITY_CATEGORIES = ['Optimale', 'Faible']
+
+# Conversions temporelles sur les horodatages datetime64[ns]
+NS_PER_HOUR = 3_600 * 10**9   # Nanosecondes par heure
+NS_PER_DAY = 24 * NS_PER_HOUR # Nanosecondes par jour
 
 st.set_page_config(
     page_title="ISS Predictor Pro",
@@ -54,6 +81,108 @@ st.set_page_config(
 
 # --- FONCTIONS UTILITAIRES ET LOGIQUE MÉTIER ---
 
+# Ressources réseau partagées par toutes les sessions (créées une seule fois via st.cache_resource)
+
+@st.cache_resource(show_spinner=False)
+def get_geolocator():
+    """
+    Service de géocodage Nominatim (utilisé pour geopy).
+    Utiliser un agent utilisateur unique est une bonne pratique ;
+    l'adaptateur requests de geopy conserve sa propre session (keep-alive) entre les appels.
+    """
+    return Nominatim(
+        user_agent="iss_predictor_pro_app",
+        adapter_factory=partial(RequestsAdapter, pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_http_session():
+    """
+    Session HTTP pour l'API ISS : réutilise la connexion TCP au lieu d'en ouvrir une par appel.
+    """
+    session = requests.Session()
+    session.mount('http://', HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE))
+    return session
+
+@st.cache_resource(show_spinner=False)
+def get_geocode_cache_lock():
+    """
+    Verrou d'accès au fichier dbm, partagé par toutes les sessions Streamlit du processus
+    (une variable de module serait recréée à chaque rerun du script).
+    """
+    return threading.Lock()
+
+def strip_latin_accents(text):
+    """
+    Retire les accents des lettres latines (é -> e) en conservant les autres écritures
+    (ex: les signes diacritiques japonais ne sont pas supprimés).
+    """
+    kept = []
+    base_is_ascii = False
+    for c in unicodedata.normalize('NFKD', text):
+        if unicodedata.combining(c):
+            if base_is_ascii:
+                continue
+        else:
+            base_is_ascii = c.isascii()
+        kept.append(c)
+    return unicodedata.normalize('NFC', ''.join(kept))
+
+def clean_address(address):
+    """
+    Nettoyage léger envoyé tel quel à Nominatim : espaces et virgules uniquement,
+    sans retirer de mots (ex: "Kansas City" doit rester "Kansas City").
+    """
+    cleaned = re.sub(r'\s*,\s*', ', ', address)
+    return re.sub(r'\s+', ' ', cleaned).strip(' ,')
+
+def normalize_address(address):
+    """
+    Clé de cache d'une adresse (accents latins, minuscules, espaces et virgules) :
+    des saisies équivalentes ("Orléans" / "orleans ") partagent la même entrée de cache.
+    """
+    return clean_address(strip_latin_accents(address).lower())
+
+class AddressNotFoundError(LookupError):
+    """
+    Adresse introuvable pour Nominatim. Levée (et non retournée) pour que st.cache_data
+    ne mémorise pas ce résultat négatif : l'adresse est retentée au prochain appel.
+    """
+
+@st.cache_data(ttl=GEOCODE_CACHE_TTL, show_spinner=False)
+def geocode_normalized_address(normalized_address, _query):
+    """
+    Géocode une adresse : cache disque (dbm) d'abord, Nominatim seulement en cas d'absence.
+    Le cache est indexé par l'adresse normalisée ; _query (saisie nettoyée, ignorée par le hachage
+    de st.cache_data) est la requête réellement envoyée à Nominatim.
+    Retourne (latitude, longitude, adresse complète) ; lève AddressNotFoundError si l'adresse est introuvable.
+    """
+    key = hashlib.md5(normalized_address.encode('utf-8')).hexdigest()
+
+    # Cache disque facultatif : s'il est illisible (dossier en lecture seule, fichier verrouillé),
+    # on interroge simplement Nominatim
+    try:
+        with get_geocode_cache_lock(), dbm.open(GEOCODE_CACHE_FILE, 'c') as db:
+            cached = json.loads(db[key]) if key in db else None
+    except (dbm.error, OSError):
+        cached = None
+
+    # Entrée valide : [lat, lon, adresse, date d'enregistrement] de moins de GEOCODE_DISK_CACHE_TTL
+    if cached and len(cached) == 4 and time.time() - cached[3] < GEOCODE_DISK_CACHE_TTL:
+        return tuple(cached[:3])
+
+    location = get_geolocator().geocode(_query, timeout=10)
+    if not location:
+        raise AddressNotFoundError(_query)
+
+    result = (location.latitude, location.longitude, location.address)
+    try:
+        with get_geocode_cache_lock(), dbm.open(GEOCODE_CACHE_FILE, 'c') as db:
+            db[key] = json.dumps([*result, time.time()])
+    except (dbm.error, OSError):
+        pass # Résultat non persisté, mais toujours retourné (et gardé par st.cache_data)
+    return result
+
 def geocode_address(address):
     """
     Tente d'obtenir les coordonnées précises pour une adresse via geopy (Nominatim).
@@ -63,14 +192,15 @@ def geocode_address(address):
         return DEFAULT_LAT, DEFAULT_LON, "Localisation par défaut (Paris)", True
 
     try:
-        location = geolocator.geocode(address, timeout=10)
-        
-        if location:
-            return location.latitude, location.longitude, location.address, True
-        else:
-            # Utilisation de f-string pour une meilleure lisibilité
-            st.warning(f"Impossible de géocoder l'adresse '{address}'. Utilisation de la localisation par défaut.")
-            return DEFAULT_LAT, DEFAULT_LON, f"Géocodage échoué pour: '{address}'. Par défaut (Paris).", False
+        latitude, longitude, full_address = geocode_normalized_address(
+            normalize_address(address), clean_address(address)
+        )
+        return latitude, longitude, full_address, True
+
+    except AddressNotFoundError:
+        # Utilisation de f-string pour une meilleure lisibilité
+        st.warning(f"Impossible de géocoder l'adresse '{address}'. Utilisation de la localisation par défaut.")
+        return DEFAULT_LAT, DEFAULT_LON, f"Géocodage échoué pour: '{address}'. Par défaut (Paris).", False
             
     except Exception as e:
         # Erreur générale de connexion ou autre
@@ -81,33 +211,39 @@ def geocode_address(address):
 def mock_fetch_iss_passes(lat, lon, num_passes=MAX_PASSES):
     """
     Génère des données de passage synthétiques pour le test lorsque l'API est en panne.
+    Retourne deux tableaux NumPy : horodatages de début (int64) et durées en secondes (int32).
     """
-    mock_data = []
-    current_timestamp = int(time.time())
-    
-    for _ in range(num_passes):
-        # Intervalle basé sur le cycle orbital (environ 90 minutes = 5400 secondes)
-        # Ajout d'une plage plus réaliste pour la prochaine apparition
-        interval = 5400 + random.randint(1800, 7200) # Entre 90min et 3.5h d'intervalle
-        current_timestamp += interval
-        
-        # Simulation d'une distribution de durée
-        duration = random.choice(
-            [random.randint(100, 300) for _ in range(8)] + 
-            [random.randint(400, 600) for _ in range(2)]
-        )
-        
-        mock_data.append({
-            'risetime': current_timestamp,
-            'duration': duration
-        })
-    return mock_data
+    rng = np.random.default_rng()
+
+    # Intervalle basé sur le cycle orbital (environ 90 minutes = 5400 secondes)
+    # Ajout d'une plage plus réaliste pour la prochaine apparition
+    intervals = 5400 + rng.integers(1800, 7200, num_passes, endpoint=True) # Entre 90min et 3.5h d'intervalle
+    risetimes = int(time.time()) + np.cumsum(intervals)
+
+    # Simulation d'une distribution de durée : passages courts (80%) ou longs (20%)
+    short_durations = rng.integers(100, 300, num_passes, endpoint=True)
+    long_durations = rng.integers(400, 600, num_passes, endpoint=True)
+    durations = np.where(rng.random(num_passes) < 0.2, long_durations, short_durations)
+
+    return risetimes.astype(np.int64), durations.astype(np.int32)
+
+def parse_iss_passes(api_passes):
+    """
+    Convertit la réponse JSON de l'API (liste de {'risetime', 'duration'}) en deux tableaux NumPy
+    typés : horodatages de début (int64) et durées en secondes (int32).
+    Les valeurs mal formées deviennent NaN et sont écartées par un masque (sans try/except par ligne).
+    """
+    raw_risetimes = pd.to_numeric([p.get('risetime') for p in api_passes], errors='coerce')
+    raw_durations = pd.to_numeric([p.get('duration') for p in api_passes], errors='coerce')
+    is_valid = np.isfinite(raw_risetimes) & np.isfinite(raw_durations)
+
+    return raw_risetimes[is_valid].astype(np.int64), raw_durations[is_valid].astype(np.int32)
 
 @st.cache_data(ttl=600) # Mise en cache pour 10 minutes (performant)
 def fetch_iss_passes(lat, lon):
     """
     Appelle l'API Open-Notify pour obtenir les heures de passage de l'ISS (avec failover).
-    Retourne les données et un message de statut propre.
+    Retourne les horodatages de début, les durées (tableaux NumPy) et un message de statut propre.
     """
     params = {
         'lat': lat,
@@ -116,69 +252,54 @@ def fetch_iss_passes(lat, lon):
     }
     
     try:
-        response = requests.get(ISS_PASS_API_URL, params=params, timeout=10)
+        response = get_http_session().get(ISS_PASS_API_URL, params=params, timeout=10)
         
         if response.status_code != 200:
              status_msg = f"API ISS : Échec HTTP {response.status_code}. Bascule sur données simulées."
-             return mock_fetch_iss_passes(lat, lon), status_msg 
+             return *mock_fetch_iss_passes(lat, lon), status_msg 
         
         data = response.json()
         
         if data.get('message') == 'success':
-            return data.get('response', []), "API ISS : Connexion réussie."
+            return *parse_iss_passes(data.get('response', [])), "API ISS : Connexion réussie."
         else:
             status_msg = f"API ISS : Message d'échec interne ({data.get('reason', 'Inconnu')}). Bascule sur données simulées."
-            return mock_fetch_iss_passes(lat, lon), status_msg
+            return *mock_fetch_iss_passes(lat, lon), status_msg
             
     except requests.exceptions.RequestException:
         status_msg = "API ISS : Échec de connexion/Timeout. Bascule sur données simulées."
-        return mock_fetch_iss_passes(lat, lon), status_msg 
+        return *mock_fetch_iss_passes(lat, lon), status_msg 
 
-def get_mock_weather(date_time):
+def get_mock_weather(date_times):
     """
-    FONCTION DE SIMULATION MÉTÉO. Simule une probabilité de ciel dégagé basée sur l'heure.
-    Simplifié pour ne prendre que l'heure pour l'efficacité.
+    FONCTION DE SIMULATION MÉTÉO (vectorisée). Tire la condition du ciel de tous les passages
+    en un seul appel NumPy plutôt qu'un appel par passage.
+    Tirage par inverse de la fonction de répartition précalculée (WEATHER_CDF) : une table de
+    correspondance, sans branche ni recalcul des probabilités à chaque appel.
     """
-    days_in_future = (date_time.date() - datetime.now().date()).days
-    
-    # Plus on est loin dans le futur, plus la prévision est incertaine
-    if days_in_future > 15:
-        base_p = [0.1, 0.2, 0.7] # Très incertain
-    else:
-        # Heures optimales pour l'observation visuelle (Aube/Crépuscule)
-        hour = date_time.hour
-        if (5 <= hour <= 7) or (19 <= hour <= 21):
-            base_p = [0.7, 0.2, 0.1] # Forte chance de Dégagé
-        else:
-            base_p = [0.25, 0.35, 0.4] # Distribution plus uniforme
-
-    return np.random.choice(["Ciel Dégagé", "Peu Nuageux", "Couvert", "Pluvieux"],p=[0.5, 0.2, 0.2, 0.1])
+    u = np.random.random(len(date_times))
+    return WEATHER_CATEGORIES[np.searchsorted(WEATHER_CDF, u, side='right')]
 
 
-def get_sol_ciel_category(risetime):
+def get_sol_ciel_category(hours):
     """
-    Détermine la catégorie Sol/Ciel (moment de la journée) et la visibilité ISS.
+    Détermine la catégorie Sol/Ciel (moment de la journée) et la visibilité ISS
+    pour un tableau NumPy d'heures.
     """
-    hour = risetime.hour
-    
     # Visibilité optimale (ISS éclairée par le Soleil, observateur dans la nuit/crépuscule)
-    if 5 <= hour <= 7:
-        category = 'Aube'
-        visibility = 'Optimale'
-    elif 19 <= hour <= 21:
-        category = 'Crépuscule'
-        visibility = 'Optimale'
-    elif 7 < hour < 19:
-        category = 'Jour'
-        visibility = 'Faible' # Trop de lumière solaire
-    else: # 21h à 5h
-        category = 'Nuit Profonde'
-        visibility = 'Faible' # L'ISS est dans l'ombre de la Terre
-        
+    is_dawn = (hours >= 5) & (hours <= 7)
+    is_dusk = (hours >= 19) & (hours <= 21)
+    is_day = (hours > 7) & (hours < 19) # Trop de lumière solaire
+
+    # Nuit Profonde (21h à 5h) : l'ISS est dans l'ombre de la Terre
+    category = np.select([is_dawn, is_dusk, is_day], ['Aube', 'Crépuscule', 'Jour'], default='Nuit Profonde')
+    visibility = np.where(is_dawn | is_dusk, 'Optimale', 'Faible')
+
     return category, visibility
 
 
 # Dictionnaire de Mapping pour une résolution plus rapide des symboles
+# (appliqué colonne par colonne : Series.map / cat.rename_categories, sans lookup Python par ligne)
 SYMBOL_MAP = {
     'Aube': "🌅 Aube", 
     'Crépuscule': "🌇 Crépuscule", 
@@ -192,154 +313,182 @@ SYMBOL_MAP = {
     'Faible': "🔴 Faible"
 }
 
-def get_symbol_display(status):
-    """ Fonction de lookup unifiée pour les symboles """
-    return SYMBOL_MAP.get(status, status)
-
-def process_passes(raw_passes, preferred_time_slot, min_duration_sec, start_date):
+def prepare_chart_data(df_sorted):
+    """
+    Construit à partir du classement les colonnes de la frise chronologique (heure décimale, jour,
+    durée en minutes, libellés, symboles). Appelée une seule fois par prédiction,
+    et non à chaque rerun de l'interface.
+    """
+    # Colonnes sources extraites une seule fois en ndarray
+    passage_ns = df_sorted['Date Heure du Passage (UTC)'].to_numpy('datetime64[ns]').view('i8')
+    durations_sec = df_sorted['Durée (Secondes)'].to_numpy(np.int64)
+
+    # Heure décimale et jour calculés en un seul passage sur les entiers (ns) sous-jacents
+    days, ns_of_day = np.divmod(passage_ns, NS_PER_DAY)
+    # Minutes/secondes en une opération vectorielle, puis concaténation de chaînes NumPy (sans .apply)
+    label_minutes, label_seconds = np.divmod(durations_sec, 60)
+
+    # Une seule construction de DataFrame (pas de copie puis d'insertions colonne par colonne) ;
+    # l'index du classement est conservé : rang = index + 1
+    return pd.DataFrame({
+        'Date': days.astype('datetime64[D]'),
+        'Heure du Jour (Décimale)': ns_of_day / NS_PER_HOUR,
+        'Durée (Min)': durations_sec / 60,
+        'Label Passage': np.char.add(
+            np.char.add("Durée: ", label_minutes.astype(str)),
+            np.char.add(np.char.add("m ", label_seconds.astype(str)), "s")
+        ),
+        'Symbole Moment': df_sorted['Moment Sol/Ciel'].map(SYMBOL_MAP).to_numpy()
+    }, index=df_sorted.index)
+
+@st.cache_data(ttl=600, show_spinner=False) # Évite de tout recalculer si les entrées n'ont pas changé
+def process_passes(risetimes_ts, durations, preferred_time_slot, min_duration_sec, start_date):
     """
-    Traite les données brutes, applique les filtres, ajoute les analyses et prépare les DataFrames finaux.
+    Traite les données brutes (horodatages et durées en tableaux NumPy), applique les filtres,
+    ajoute les analyses et prépare les DataFrames finaux.
+    Mis en cache sur (passages bruts, créneau, durée minimale, date de début) : Streamlit hache
+    ces arguments par valeur, la météo simulée reste donc stable d'un rerun à l'autre.
     """
     
-    if not raw_passes:
+    if len(risetimes_ts) == 0:
         data_span = "(Aucune donnée brute)"
-        return pd.DataFrame(), pd.DataFrame(), data_span, pd.DataFrame()
-
-    # 1. Conversion en DataFrame et ajout des colonnes de base
-    data = []
-    for p in raw_passes:
-        # Utilisation d'un bloc try/except minimal pour ignorer les entrées mal formées
-        try:
-            risetime = datetime.fromtimestamp(p['risetime'])
-            duration = p['duration']
-            
-            # Application des fonctions utilitaires (moins coûteux que les opérations DF)
-            time_of_day_category, visibility_status = get_sol_ciel_category(risetime)
-            weather_status = get_mock_weather(risetime)
-            
-            data.append({
-                'Date Heure du Passage (UTC)': risetime,
-                'Durée (Secondes)': duration,
-                'Moment Sol/Ciel': time_of_day_category, 
-                'Visibilité ISS Estimée': visibility_status, 
-                'Visibilité Météo (Simulée)': weather_status
-            })
-        except (TypeError, ValueError):
-            continue
-            
-    df = pd.DataFrame(data)
-    
-    # Calcule la plage de données brutes
-    min_date = df['Date Heure du Passage (UTC)'].min().strftime('%d %b')
-    max_date = df['Date Heure du Passage (UTC)'].max().strftime('%d %b')
+        return pd.DataFrame(), data_span, pd.DataFrame(), pd.DataFrame()
+
+    # 1. Application vectorisée des fonctions utilitaires sur l'ensemble des passages (heure UTC)
+    hours = (risetimes_ts // 3600) % 24
+    time_of_day_category, visibility_status = get_sol_ciel_category(hours)
+    weather_status = get_mock_weather(risetimes_ts)
+
+    # Calcule la plage de données brutes (directement sur les horodatages)
+    min_date = pd.to_datetime(risetimes_ts.min(), unit='s').strftime('%d %b')
+    max_date = pd.to_datetime(risetimes_ts.max(), unit='s').strftime('%d %b')
     full_data_span = f"(Du {min_date} au {max_date})"
     
     # 2. APPLICATION DES FILTRES (Date, Durée, Créneau Horaire)
-    
-    # Filtre de Date: utilisation de datetime.combine pour comparer correctement
-    df_filtered = df[df['Date Heure du Passage (UTC)'] >= datetime.combine(start_date, datetime.min.time())].copy()
-    
+    # Les filtres sont calculés sur les tableaux NumPy : seuls les passages retenus deviennent un DataFrame
+
+    # Filtre de Date: minuit (UTC) du jour de début, en horodatage
+    start_ts = int(pd.Timestamp(start_date).timestamp())
+    mask = risetimes_ts >= start_ts
+
     # Filtre de Durée
-    df_filtered = df_filtered[df_filtered['Durée (Secondes)'] >= min_duration_sec].copy()
+    mask &= durations >= min_duration_sec
 
     # Filtre de Créneau Horaire
     if preferred_time_slot != "Tous":
         if preferred_time_slot == "Faible Visibilité":
             # Si Faible Visibilité est sélectionné, inclure Jour et Nuit Profonde
-            df_filtered = df_filtered[df_filtered['Moment Sol/Ciel'].isin(['Jour', 'Nuit Profonde'])].copy()
+            mask &= np.isin(time_of_day_category, ['Jour', 'Nuit Profonde'])
         else:
             # Sinon, filtrer sur le créneau précis
-            df_filtered = df_filtered[df_filtered['Moment Sol/Ciel'] == preferred_time_slot].copy()
+            mask &= time_of_day_category == preferred_time_slot
+
+    filtered_count = int(mask.sum())
 
     # 3. SÉLECTION POUR LE CLASSEMENT (Passages Observables Potentiels)
-    df_filtered_for_scoring = df_filtered[
-        df_filtered['Visibilité Météo (Simulée)'].isin(["Ciel Dégagé", "Peu Nuageux"])
-    ].copy()
+    mask &= np.isin(weather_status, ["Ciel Dégagé", "Peu Nuageux"])
+    observable_count = int(mask.sum())
+
+    # Génération du Résumé (tous les comptes sont connus dès les masques)
+    summary = (
+        f"**Passages Bruts {full_data_span}:** {len(risetimes_ts)}. "
+        f"**Passages Filtrés (Date/Durée/Heure):** {filtered_count}. "
+        f"**Passages Observables Classés (Ciel Dégagé/Peu Nuageux):** {observable_count}."
+    )
+
+    # Aucun passage retenu : inutile de construire, trier et formater des DataFrames vides
+    if observable_count == 0:
+        return pd.DataFrame(), summary, pd.DataFrame(), pd.DataFrame()
+
+    # Le DataFrame n'est construit que sur les survivants (conversion des dates comprise)
+    df_filtered_for_scoring = pd.DataFrame({
+        'Date Heure du Passage (UTC)': pd.to_datetime(risetimes_ts[mask], unit='s'),
+        'Durée (Secondes)': durations[mask],
+        'Moment Sol/Ciel': time_of_day_category[mask],
+        'Visibilité ISS Estimée': pd.Categorical(visibility_status[mask], categories=VISIBILITY_CATEGORIES),
+        'Visibilité Météo (Simulée)': pd.Categorical(weather_status[mask], categories=WEATHER_CATEGORIES)
+    })
 
     
     # 4. LOGIQUE DE CLASSEMENT (Score Composite) - **OPTIMISATION VECTORIELLE**
-    df_sorted = pd.DataFrame()
-    
-    if not df_filtered_for_scoring.empty:
-        
-        # --- Vectorisation de Score_Visibilite (np.where) ---
-        df_filtered_for_scoring['Score_Visibilite'] = np.where(
-            df_filtered_for_scoring['Visibilité ISS Estimée'].str.contains('Optimale'),
-            SCORE_VISIBILITY_OPTIMAL,
-            0
-        )
-        
-        # --- Vectorisation de Score_Meteo (np.select pour les conditions multiples) ---
-        conditions = [
-            df_filtered_for_scoring['Visibilité Météo (Simulée)'].str.contains('Ciel Dégagé'),
-            df_filtered_for_scoring['Visibilité Météo (Simulée)'].str.contains('Peu Nuageux'),
-            df_filtered_for_scoring['Visibilité Météo (Simulée)'].str.contains('Pluvieux')  # <-- ajout
-        ]
-        choices = [
-            SCORE_WEATHER_DEGAGE,
-            SCORE_WEATHER_PEU_NUAGEUX,
-            0  # Score pour Pluvieux, peut être 0 ou négatif
-        ]
-        df_filtered_for_scoring['Score_Meteo'] = np.select(conditions, choices, default=0)
-
-        # Calcul du score total et tri
-        df_filtered_for_scoring['Total_Score'] = df_filtered_for_scoring['Score_Visibilite'] + df_filtered_for_scoring['Score_Meteo']
-        
-        # Tri: Score Total (combiné) > Durée
-        df_sorted = df_filtered_for_scoring.sort_values(
-            by=['Total_Score', 'Durée (Secondes)'], 
-            ascending=[False, False]
-        ).reset_index(drop=True).drop(columns=['Total_Score', 'Score_Visibilite', 'Score_Meteo'])
+    # Les scores sont lus sur les codes entiers des catégories (égalité exacte, sans regex)
+    visibility_codes = df_filtered_for_scoring['Visibilité ISS Estimée'].cat.codes.to_numpy()
+    weather_codes = df_filtered_for_scoring['Visibilité Météo (Simulée)'].cat.codes.to_numpy()
 
-    # 5. PRÉPARATION POUR L'AFFICHAGE (Ajout des symboles et formatage des colonnes)
-    df_observable_display = pd.DataFrame()
-    if not df_sorted.empty:
-        df_observable_display = df_sorted.copy()
-        
-        # Utilisation de la fonction de lookup unifiée
-        df_observable_display['Moment/Ciel'] = df_observable_display['Moment Sol/Ciel'].apply(get_symbol_display)
-        df_observable_display['Visibilité ISS'] = df_observable_display['Visibilité ISS Estimée'].apply(get_symbol_display)
-        df_observable_display['Météo Sim.'] = df_observable_display['Visibilité Météo (Simulée)'].apply(get_symbol_display)
-        
-        # Formatage de la durée
-        df_observable_display['Durée (min:sec)'] = df_observable_display['Durée (Secondes)'].apply(
-            lambda x: f"{x // 60:02d}:{x % 60:02d}"
-        )
-        
-        # Sélection et renommage des colonnes pour la table finale (ordre de lecture optimisé)
-        df_observable_display = df_observable_display[[
-            'Date Heure du Passage (UTC)', 
-            'Durée (min:sec)', 
-            'Visibilité ISS', 
-            'Moment/Ciel', 
-            'Météo Sim.'
-        ]].rename(columns={
-            'Date Heure du Passage (UTC)': 'Date et Heure (UTC)',
-            'Durée (min:sec)': 'Durée'
-        })
-        
-        # Réindexer pour commencer à 1
-        df_observable_display.index = np.arange(1, len(df_observable_display) + 1)
-        df_observable_display.index.name = 'Rang'
+    # --- Score_Visibilite : code 0 = Optimale ---
+    score_visibilite = (visibility_codes == 0) * SCORE_VISIBILITY_OPTIMAL
 
+    # --- Score_Meteo : un score par code météo (np.choose) ---
+    score_meteo = np.choose(weather_codes, WEATHER_SCORES)
 
-    # 6. Génération du Résumé
-    summary = (
-        f"**Passages Bruts {full_data_span}:** {len(df)}. "
-        f"**Passages Filtrés (Date/Durée/Heure):** {len(df_filtered)}. "
-        f"**Passages Observables Classés (Ciel Dégagé/Peu Nuageux):** {len(df_sorted)}."
+    # Calcul du score total (tableau NumPy, sans colonnes temporaires à supprimer ensuite)
+    total_score = score_visibilite + score_meteo
+
+    # Tri: Score Total (combiné) > Durée, tous deux décroissants (np.lexsort : dernière clé = clé principale)
+    order = np.lexsort((
+        -df_filtered_for_scoring['Durée (Secondes)'].to_numpy(),
+        -total_score
+    ))
+    df_sorted = df_filtered_for_scoring.iloc[order].reset_index(drop=True)
+
+    # 5. PRÉPARATION POUR L'AFFICHAGE (Ajout des symboles et formatage des colonnes)
+    df_observable_display = df_sorted.copy()
+    
+    # Symboles via catégories : un lookup par catégorie distincte, et non par ligne
+    df_observable_display['Moment/Ciel'] = df_observable_display['Moment Sol/Ciel'].astype('category').cat.rename_categories(SYMBOL_MAP)
+    df_observable_display['Visibilité ISS'] = df_observable_display['Visibilité ISS Estimée'].astype('category').cat.rename_categories(SYMBOL_MAP)
+    df_observable_display['Météo Sim.'] = df_observable_display['Visibilité Météo (Simulée)'].astype('category').cat.rename_categories(SYMBOL_MAP)
+
+    # Formatage vectoriel de la durée (mm:ss)
+    minutes, seconds = np.divmod(df_observable_display['Durée (Secondes)'].to_numpy(), 60)
+    df_observable_display['Durée (min:sec)'] = np.char.add(
+        np.char.add(np.char.zfill(minutes.astype(str), 2), ':'),
+        np.char.zfill(seconds.astype(str), 2)
+    )
+    
+    # Sélection et renommage des colonnes pour la table finale (ordre de lecture optimisé) :
+    # exactement les colonnes de DATAFRAME_COLUMN_CONFIG, aucune projection n'est nécessaire à l'affichage
+    df_observable_display = df_observable_display[[
+        'Date Heure du Passage (UTC)', 
+        'Durée (min:sec)', 
+        'Visibilité ISS', 
+        'Moment/Ciel', 
+        'Météo Sim.'
+    ]].rename(columns={
+        'Date Heure du Passage (UTC)': 'Date et Heure (UTC)',
+        'Durée (min:sec)': 'Durée'
+    })
+    
+    # Réindexer pour commencer à 1 (RangeIndex : aucun tableau d'index matérialisé)
+    df_observable_display = df_observable_display.set_axis(
+        pd.RangeIndex(1, len(df_observable_display) + 1, name='Rang'), axis=0
     )
 
-    # Retourne df_sorted pour le graphique et df_observable_display pour les tableaux
-    return df, df_observable_display, summary, df_sorted
+    # Retourne df_sorted (carte), df_chart_ready (frise chronologique) et df_observable_display (tableaux)
+    return df_observable_display, summary, df_sorted, prepare_chart_data(df_sorted)
 
 
+def compute_arc_points(start, end, observer, num_points):
+    """
+    Noyau numérique pur (NumPy uniquement, sans pandas ni Streamlit) de la trajectoire simulée.
+    start, end et observer sont des vecteurs (lat, lon) ; retourne un tableau (num_points, 2).
+    """
+    t = np.linspace(0, 1, num_points)[:, None]
+    points = start + t * (end - start)
+
+    # Courbure au milieu de l'arc
+    mid_point_adjustment = 0.5 - np.abs(t - 0.5)
+    points += (observer - points) * mid_point_adjustment * 0.5
+    return points
+
+@st.cache_data(ttl=600, max_entries=50, show_spinner=False) # Recalculée seulement si (lat, lon, durée) changent (cache borné)
 def simulate_iss_trajectory(observer_lat, observer_lon, pass_duration_sec):
     """
     Simule une trajectoire ISS plausible (un arc) au-dessus de la zone pour la visualisation.
+    Mise en cache : l'arc aléatoire reste identique d'un rerun à l'autre pour un même passage.
+    Retourne deux tableaux NumPy (latitudes, longitudes), directement consommés par Plotly.
     """
     num_points = 20
-    trajectory_points = []
     
     # Détermination aléatoire de la direction du passage
     lat_diff_direction = 1 if random.random() > 0.5 else -1
@@ -352,25 +501,15 @@ def simulate_iss_trajectory(observer_lat, observer_lon, pass_duration_sec):
     start_lon = observer_lon + lon_diff_direction * (arc_span / 2) * random.uniform(0.4, 0.8)
     end_lon = observer_lon - lon_diff_direction * (arc_span / 2) * random.uniform(0.4, 0.8)
 
-    for i in range(num_points):
-        t = i / (num_points - 1)
-        lat = start_lat + t * (end_lat - start_lat)
-        lon = start_lon + t * (end_lon - start_lon)
-        
-        # Courbure au milieu de l'arc
-        mid_point_adjustment = 0.5 - abs(t - 0.5)
-        
-        lat_adjusted = lat + (observer_lat - lat) * mid_point_adjustment * 0.5
-        lon_adjusted = lon + (observer_lon - lon) * mid_point_adjustment * 0.5
-        
-        trajectory_points.append({
-            'lat': lat_adjusted,
-            'lon': lon_adjusted,
-            'Type': 'Trajectoire ISS',
-            'Info': f'Passage Simulé (Durée: {pass_duration_sec // 60}m {pass_duration_sec % 60}s)'
-        })
-        
-    return pd.DataFrame(trajectory_points)
+    # Calcul vectoriel de l'arc : une seule expression (N, 2) pour la latitude et la longitude
+    points = compute_arc_points(
+        np.array([start_lat, start_lon]),
+        np.array([end_lat, end_lon]),
+        np.array([observer_lat, observer_lon]),
+        num_points
+    ).astype(np.float32) # float32 : précision métrique, suffisante pour le tracé
+
+    return points[:, 0], points[:, 1]
 
 # --- INTERFACE UTILISATEUR (FRONTEND) ---
 
@@ -397,6 +536,172 @@ DATAFRAME_COLUMN_CONFIG = {
     )
 }
 
+# Couleurs des moments de la journée dans la frise chronologique
+COLOR_MAP_MOMENT = {
+    "🌅 Aube": "#FFC107",
+    "🌇 Crépuscule": "#FF5722",
+    "☀️ Jour": "#42A5F5",
+    "🌑 Nuit Profonde": "#414040"
+}
+
+# Graduations de l'axe des heures (00:00 à 24:00)
+YAXIS_TICKVALS = list(range(25))
+YAXIS_TICKTEXT = [f"{h:02d}:00" for h in YAXIS_TICKVALS]
+
+
+@st.cache_data(ttl=600, max_entries=50, show_spinner=False) # Figure reconstruite seulement si ses entrées changent (cache borné)
+def build_map_figure(lat, lon, display_location, is_processed, best_duration, best_time_str):
+    """
+    Construit la carte de l'observateur (et la trajectoire simulée du meilleur passage s'il existe).
+    Mise en cache : les reruns sans changement de position ni de passage réutilisent la figure.
+    """
+    # Trace de l'observateur
+    traces = [px_go.Scattermapbox(
+        lat=[lat],
+        lon=[lon],
+        mode='markers',
+        marker=px_go.scattermapbox.Marker(
+            size=15,
+            symbol='star',
+            color='#FF4B4B',
+            opacity=0.9
+        ),
+        hovertext=[display_location],
+        hoverinfo='text',
+        name='Légende'
+    )]
+    title = None
+
+    # --- Ajout du point rouge "Vous êtes ici" uniquement si traitement lancé ---
+    if is_processed:
+        traces.append(px_go.Scattermapbox(
+            lat=[lat],
+            lon=[lon],
+            mode='markers',
+            marker=px_go.scattermapbox.Marker(
+                size=14,
+                color='#FF0000',
+                opacity=0.95
+            ),
+            hoverinfo='text',
+            hovertext=f"Position utilisateur (approx.)\nLat: {lat:.4f}, Lon: {lon:.4f}",
+            name='Votre localisation ici'
+        ))
+
+        # Si un passage est disponible, afficher la trajectoire ISS
+        if best_duration is not None:
+            # Simuler trajectoire
+            lat_t, lon_t = simulate_iss_trajectory(lat, lon, best_duration)
+
+            traces.append(px_go.Scattermapbox(
+                lat=lat_t,
+                lon=lon_t,
+                mode='lines',
+                line=dict(width=3, color='#42A5F5'),
+                hoverinfo='none',
+                name='Trajectoire ISS simulée'
+            ))
+
+            title = f"Trajectoire simulée du passage optimal : {best_time_str}"
+
+    # Figure construite en un seul appel (traces + layout), sans mutations successives
+    fig_map = px_go.Figure(
+        data=traces,
+        layout=px_go.Layout(
+            title=title,
+            mapbox_style="open-street-map",
+            mapbox_zoom=6,
+            mapbox_center={"lat": lat, "lon": lon},
+            legend=dict(yanchor="top", y=0.99, xanchor="left", x=0.01),
+            margin={"r":0,"t":50,"l":0,"b":0},
+            height=600
+        )
+    )
+
+    return fig_map
+
+@st.cache_data(ttl=600, max_entries=50, show_spinner=False) # Clé : contenu du DataFrame (haché par Streamlit)
+def build_time_of_day_figure(df_chart_data):
+    """
+    Construit la frise chronologique des passages (Top 10 en rouge, Top 11-20 en vert).
+    Mise en cache : tant que le classement ne change pas, la figure Plotly n'est pas reconstruite.
+    """
+    # Création graphique de base (WebGL : rendu GPU au lieu d'un noeud SVG par point)
+    fig_time_of_day = px_go.Figure()
+
+    # Même échelle de taille que px.scatter (aire proportionnelle à la durée, 20 px max)
+    size_ref = 2.0 * df_chart_data['Durée (Min)'].max() / (20 ** 2)
+
+    # Une trace par moment de la journée (équivalent de color='Symbole Moment')
+    for moment, df_moment in df_chart_data.groupby('Symbole Moment', observed=True, sort=False):
+        fig_time_of_day.add_trace(px_go.Scattergl(
+            x=df_moment['Date'],
+            y=df_moment['Heure du Jour (Décimale)'],
+            mode='markers',
+            name=moment,
+            marker=dict(
+                color=COLOR_MAP_MOMENT.get(moment),
+                size=df_moment['Durée (Min)'],
+                sizemode='area',
+                sizeref=size_ref,
+                sizemin=0
+            ),
+            hovertext=df_moment['Label Passage'],
+            hovertemplate='<b>%{hovertext}</b><br><br>Jour=%{x}<br>Heure (UTC)=%{y}<br>Durée (Min)=%{marker.size}<extra></extra>'
+        ))
+
+    def _cd(sub):
+        # customdata (rang, durée) en un bloc (N, 2) contigu, sans DataFrame intermédiaire
+        return np.column_stack([sub.index.to_numpy() + 1, sub['Durée (Min)'].to_numpy()])
+
+    # Top10 rouge
+    df_top10 = df_chart_data.iloc[:10] # Classement déjà trié : tranche positionnelle, sans masque
+    fig_time_of_day.add_trace(px_go.Scattergl(
+        x=df_top10['Date'],
+        y=df_top10['Heure du Jour (Décimale)'],
+        mode='markers',
+        name='Top 10 (Optimal)',
+        marker=dict(color='red', size=df_top10['Durée (Min)'].to_numpy()*2.5+10, symbol='circle-open', line=dict(width=3)),
+        customdata=_cd(df_top10), # Rang = index + 1
+        hovertemplate='<b>🥇 Rang:</b> %{customdata[0]}<br><b>Durée:</b> %{customdata[1]:.1f} min<extra></extra>'
+    ))
+
+    # Top11-20 vert
+    df_mid = df_chart_data.iloc[10:20]
+    fig_time_of_day.add_trace(px_go.Scattergl(
+        x=df_mid['Date'],
+        y=df_mid['Heure du Jour (Décimale)'],
+        mode='markers',
+        name='Top 11-20 (Satisfaisant)',
+        marker=dict(color='green', size=df_mid['Durée (Min)'].to_numpy()*2+8, symbol='circle-open', line=dict(width=2)),
+        customdata=_cd(df_mid),
+        hovertemplate='<b>🥈 Rang:</b> %{customdata[0]}<br><b>Durée:</b> %{customdata[1]:.1f} min<extra></extra>'
+    ))
+
+    # Mise à jour des axes et layout
+    fig_time_of_day.update_yaxes(
+        tickvals=YAXIS_TICKVALS,
+        ticktext=YAXIS_TICKTEXT,
+        range=[-1, 25],
+        title="Heure (UTC)"
+    )
+    fig_time_of_day.update_xaxes(
+        title="Jour",
+        tickangle=45,
+        dtick="D1",
+        tickformat="%d %b"
+    )
+    fig_time_of_day.update_layout(
+        title="Répartition des passages par jour et par heure dans la journée",
+        height=600,
+        legend_title_text='Légende',
+        margin=dict(l=10, r=10, t=50, b=10),
+        yaxis=dict(showgrid=True, gridcolor='lightgray'),
+        xaxis=dict(showgrid=True, gridcolor='lightgray'),
+        showlegend=True
+    )
+
+    return fig_time_of_day
 
 def process_all_data():
     """
@@ -411,19 +716,23 @@ def process_all_data():
     start_date = st.session_state.get('start_date_input', datetime.now().date())
     
     # 1. Fetch data (cachable) - Récupère aussi le statut
-    raw_passes_data, api_status_message = fetch_iss_passes(lat, lon)
+    risetimes_ts, durations, api_status_message = fetch_iss_passes(lat, lon)
     
     # 2. Process data (heavy lifting)
-    df_raw, df_observable_display, summary, df_sorted = process_passes(
-        raw_passes_data, 
+    df_observable_display, summary, df_sorted, df_chart_ready = process_passes(
+        risetimes_ts, 
+        durations,
         time_slot, 
         min_duration,
         start_date
     )
     
     # 3. Store results in session state for reuse
-    st.session_state['df_observable_display'] = df_observable_display
+    # Tranches affichées découpées une seule fois par prédiction (et non à chaque rerun)
+    st.session_state['df_top_10'] = df_observable_display.iloc[:10]
+    st.session_state['df_next_10'] = df_observable_display.iloc[10:20]
     st.session_state['df_sorted'] = df_sorted
+    st.session_state['df_chart_ready'] = df_chart_ready
     st.session_state['summary'] = summary
     st.session_state['total_observable_count'] = len(df_observable_display)
     st.session_state['api_status_message'] = api_status_message # Stocke le statut de la connexion
@@ -497,26 +806,29 @@ def main():
             )
 
             # 3️⃣ Reverse géocoding automatique si l'utilisateur saisit un lieu
-            if address_input_value.strip():
-                resolved_lat, resolved_lon, display_location, geocoding_success = geocode_address(address_input_value)
-                # Mise à jour automatique dans session_state
-                # Mise à jour safe des coordonnées manuelles
-                # Mise à jour safe après initialisation
-                if st.session_state.get('lat_manual_initialized', False):
-                    st.session_state['lat_manual_input'] = resolved_lat
-
-                if st.session_state.get('lon_manual_initialized', False):
-                    st.session_state['lon_manual_input'] = resolved_lon
-
-                # Coordonnées utilisées pour traitement et affichage
-                st.session_state['lat'] = resolved_lat
-                st.session_state['lon'] = resolved_lon
-                st.session_state['display_location'] = display_location
-                st.session_state['geocoding_success'] = geocoding_success
-
-                # Déclenchement du traitement + activation touche Entrée
-                st.session_state['is_processed'] = True
-                st.session_state['is_processed'] = True
+            # Un seul géocodage par nouvelle adresse : les reruns suivants réutilisent session_state
+            address_input_value = address_input_value.strip()
+            if not address_input_value:
+                st.session_state['last_geocoded_address'] = None
+            elif address_input_value != st.session_state.get('last_geocoded_address'):
+                resolved_lat, resolved_lon, display_location, geocoding_success = geocode_address(
+                    address_input_value
+                )
+
+                st.session_state.update({
+                    # Mise à jour safe des coordonnées manuelles (avant la création des widgets)
+                    'lat_manual_input': resolved_lat,
+                    'lon_manual_input': resolved_lon,
+                    # Coordonnées utilisées pour traitement et affichage
+                    'lat': resolved_lat,
+                    'lon': resolved_lon,
+                    'display_location': display_location,
+                    'geocoding_success': geocoding_success,
+                    # Mémorisée seulement en cas de succès : un échec est retenté (et signalé) au rerun suivant
+                    'last_geocoded_address': address_input_value if geocoding_success else None,
+                    # Déclenchement du traitement + activation touche Entrée
+                    'is_processed': True
+                })
                 
             # 4️⃣ Coordonnées GPS manuelles
             # --- INITIALISATION DES COORDONNÉES (évite -90 / -180 par défaut) ---
@@ -533,24 +845,6 @@ def main():
             if 'lon_manual_input' not in st.session_state:
                 st.session_state['lon_manual_input'] = st.session_state.get('lon', DEFAULT_LON)
 
-            # --- Reverse geocoding automatique si l'utilisateur saisit un lieu ---
-            address_input_value = st.session_state.get('address_input', '').strip()
-            if address_input_value:
-                resolved_lat, resolved_lon, display_location, geocoding_success = geocode_address(address_input_value)
-
-                # Mise à jour safe pour le reverse geocoding
-                if st.session_state.get('lat_manual_input') != resolved_lat:
-                    st.session_state['lat_manual_input'] = resolved_lat
-                if st.session_state.get('lon_manual_input') != resolved_lon:
-                    st.session_state['lon_manual_input'] = resolved_lon
-
-                # Coordonnées utilisées pour traitement et affichage
-                st.session_state['lat'] = resolved_lat
-                st.session_state['lon'] = resolved_lon
-                st.session_state['display_location'] = display_location
-                st.session_state['geocoding_success'] = geocoding_success
-                st.session_state['is_processed'] = True
-
             # --- Widgets Number Input pour Latitude / Longitude ---
             lat_manual = st.number_input(
                 "Latitude",
@@ -616,22 +910,17 @@ def main():
  
                 if st.button("Lancer l'analyse prédictive", type="primary", use_container_width=True):
                     # --- LOGIQUE DE GÉO-RÉSOLUTION ---
-                    if st.session_state.get('address_input'):
-                        # GÉOCODAGE RÉEL
-                        resolved_lat, resolved_lon, display_location, geocoding_success = geocode_address(st.session_state['address_input'])
-                    else:
+                    # GÉOCODAGE RÉEL : l'adresse saisie est déjà résolue dans session_state (étape 3️⃣)
+                    if not address_input_value:
                         # MANUEL
-                        resolved_lat = lat_manual
-                        resolved_lon = lon_manual
-                        display_location = f"Lat: {lat_manual:.4f}, Lon: {lon_manual:.4f}"
-                        geocoding_success = True 
-
-                    # Stockage des résultats dans session_state et RERUN
-                    st.session_state['lat'] = resolved_lat
-                    st.session_state['lon'] = resolved_lon
-                    st.session_state['display_location'] = display_location 
+                        st.session_state['lat'] = lat_manual
+                        st.session_state['lon'] = lon_manual
+                        st.session_state['display_location'] = f"Lat: {lat_manual:.4f}, Lon: {lon_manual:.4f}"
+                        st.session_state['geocoding_success'] = True 
+
+                    # Stockage dans session_state et RERUN
                     st.session_state['is_processed'] = True
-                    st.session_state['geocoding_success'] = geocoding_success
+                    st.session_state['viz_dirty'] = True # Relance explicite : recalcul forcé
 
                     # Efface le cache de l'API pour que la nouvelle position soit utilisée
                     fetch_iss_passes.clear()
@@ -639,95 +928,47 @@ def main():
 
 
             # --- ÉTAPE OPTIMISÉE: Traitement centralisé si le bouton a été cliqué ---
-            if 'is_processed' in st.session_state and st.session_state['is_processed']:
+            # Les résultats ne sont recalculés que si une entrée de la prédiction a changé :
+            # un clic sur PDF / Email / Agenda réutilise ceux déjà stockés dans session_state
+            prediction_inputs = (
+                st.session_state['lat'],
+                st.session_state['lon'],
+                start_date,
+                preferred_time_slot,
+                min_duration
+            )
+            if st.session_state.get('prediction_inputs') != prediction_inputs:
+                st.session_state['viz_dirty'] = True
+
+            if st.session_state.get('is_processed') and st.session_state.get('viz_dirty', True):
                 # Ceci est exécuté une seule fois par Streamlit run après un bouton/changement
                 with st.spinner(f"Traitement des données pour {st.session_state['display_location']}..."):
                     # Met à jour les DataFrames stockés dans st.session_state
                     process_all_data() 
+                st.session_state['prediction_inputs'] = prediction_inputs
+                st.session_state['viz_dirty'] = False
                 
 
         # --- Section Carte ---
         with col_map:
             st.subheader("Visualisation de la zone")
 
-            # DataFrame de l'observateur
-            map_df_observer = pd.DataFrame([{
-                'lat': st.session_state['lat'],
-                'lon': st.session_state['lon'],
-                'Type': 'Observateur',
-                'Info': st.session_state['display_location']
-            }])
-
-            # Figure initiale
-            fig_map = px_go.Figure()
-
-            # Trace de l'observateur
-            fig_map.add_trace(px_go.Scattermapbox(
-                lat=map_df_observer['lat'],
-                lon=map_df_observer['lon'],
-                mode='markers',
-                marker=px_go.scattermapbox.Marker(
-                    size=15,
-                    symbol='star',
-                    color='#FF4B4B',
-                    opacity=0.9
-                ),
-                hovertext=map_df_observer['Info'],
-                hoverinfo='text',
-                name='Légende'
-            ))
-
-            # --- Ajout du point rouge "Vous êtes ici" uniquement si traitement lancé ---
-            if st.session_state.get('is_processed'):
-                fig_map.add_trace(px_go.Scattermapbox(
-                    lat=[st.session_state['lat']],
-                    lon=[st.session_state['lon']],
-                    mode='markers',
-                    marker=px_go.scattermapbox.Marker(
-                        size=14,
-                        color='#FF0000',
-                        opacity=0.95
-                    ),
-                    hoverinfo='text',
-                    hovertext=f"Position utilisateur (approx.)\nLat: {st.session_state['lat']:.4f}, Lon: {st.session_state['lon']:.4f}",
-                    name='Votre localisation ici'
-                ))
-
-                # Si un passage est disponible, afficher la trajectoire ISS
-                df_sorted = st.session_state.get('df_sorted')
-                if df_sorted is not None and not df_sorted.empty:
-                    best_pass = df_sorted.iloc[0]
-                    best_duration = best_pass['Durée (Secondes)']
-                    best_time_str = best_pass['Date Heure du Passage (UTC)'].strftime('%d/%m à %H:%M:%S UTC')
-
-                    # Simuler trajectoire
-                    df_trajectory = simulate_iss_trajectory(
-                        st.session_state['lat'], 
-                        st.session_state['lon'],
-                        best_duration
-                    )
-
-                    fig_map.add_trace(px_go.Scattermapbox(
-                        lat=df_trajectory['lat'],
-                        lon=df_trajectory['lon'],
-                        mode='lines',
-                        line=dict(width=3, color='#42A5F5'),
-                        hoverinfo='none',
-                        name='Trajectoire ISS simulée'
-                    ))
-
-                    fig_map.update_layout(title=f"Trajectoire simulée du passage optimal : {best_time_str}")
-
-            # Layout final
-            fig_map.update_layout(
-                mapbox_style="open-street-map",
-                mapbox_zoom=6,
-                mapbox_center={"lat": st.session_state['lat'], "lon": st.session_state['lon']},
-                legend=dict(yanchor="top", y=0.99, xanchor="left", x=0.01),
-                margin={"r":0,"t":50,"l":0,"b":0},
-                height=600
+            # Si un passage est disponible, la carte affiche la trajectoire ISS du meilleur passage
+            best_duration, best_time_str = None, None
+            df_sorted = st.session_state.get('df_sorted')
+            if st.session_state.get('is_processed') and df_sorted is not None and not df_sorted.empty:
+                best_pass = df_sorted.iloc[0]
+                best_duration = int(best_pass['Durée (Secondes)'])
+                best_time_str = best_pass['Date Heure du Passage (UTC)'].strftime('%d/%m à %H:%M:%S UTC')
+
+            fig_map = build_map_figure(
+                st.session_state['lat'],
+                st.session_state['lon'],
+                st.session_state['display_location'],
+                bool(st.session_state.get('is_processed')),
+                best_duration,
+                best_time_str
             )
-
             st.plotly_chart(fig_map, use_container_width=True)
 
             st.caption(f"La carte est centrée sur: **{st.session_state['display_location']}**")
@@ -759,25 +1000,30 @@ def main():
 
             # --- 2️⃣ Envoyer Email ---
             with col_email_btn:
-                if st.button("✉️ Envoyer Email", use_container_width=True):
-                    # Affiche le champ email et bouton confirmer seulement après clic
-                    email = st.text_input("Adresse email", placeholder="ex: test@domaine.com", key="popup_email_input")
-                    if st.button("Confirmer envoi", key="popup_email_btn"):
-                        if email:
-                            send_email_with_pdf(email)  # ta fonction locale pour envoyer le PDF
-                            st.success(f"✅ PDF envoyé à {email}")
-                        else:
-                            st.warning("Veuillez saisir une adresse email.")
+                # Formulaire : la saisie ne provoque aucun rerun, seule la validation en déclenche un
+                with st.form("email_form"):
+                    email = st.text_input("✉️ Adresse email", placeholder="ex: test@domaine.com", key="popup_email_input")
+                    submitted = st.form_submit_button("Confirmer envoi", use_container_width=True)
+                if submitted:
+                    if email:
+                        send_email_with_pdf(email)  # ta fonction locale pour envoyer le PDF
+                        st.success(f"✅ PDF envoyé à {email}")
+                    else:
+                        st.warning("Veuillez saisir une adresse email.")
 
             # --- 3️⃣ Enregistrer dans agenda ---
             with col_agenda:
-                if st.button("📅 Booker agenda", use_container_width=True):
-                    suggested_slot = get_best_available_slot()  # ta fonction pour trouver le créneau
-                    chosen_slot = st.date_input("Choisir un créneau", value=suggested_slot.date(), key="agenda_date")
+                # Créneau suggéré calculé une fois : une valeur par défaut stable évite de réinitialiser le formulaire
+                if 'agenda_suggested_slot' not in st.session_state:
+                    st.session_state['agenda_suggested_slot'] = get_best_available_slot()  # ta fonction pour trouver le créneau
+                suggested_slot = st.session_state['agenda_suggested_slot']
+                with st.form("agenda_form"):
+                    chosen_slot = st.date_input("📅 Choisir un créneau", value=suggested_slot.date(), key="agenda_date")
                     chosen_time = st.time_input("Heure du créneau", value=suggested_slot.time(), key="agenda_time")
-                    if st.button("Confirmer le booking", key="agenda_confirm"):
-                        add_to_calendar(chosen_slot, chosen_time)  # ta fonction pour ajouter à l'agenda
-                        st.success("✅ Créneau enregistré dans votre agenda.")
+                    booked = st.form_submit_button("Confirmer le booking", use_container_width=True)
+                if booked:
+                    add_to_calendar(chosen_slot, chosen_time)  # ta fonction pour ajouter à l'agenda
+                    st.success("✅ Créneau enregistré dans votre agenda.")
 
             st.divider()
 
@@ -806,7 +1052,6 @@ def main():
             summary = st.session_state.get('summary', "Veuillez lancer la prédiction.")
             st.info(f"**Synthèse des passages :** {summary}")
 
-            df_observable_display = st.session_state.get('df_observable_display', pd.DataFrame())
             total_observable_count = st.session_state.get('total_observable_count', 0)
 
             if total_observable_count == 0:
@@ -818,12 +1063,9 @@ def main():
             else:
                 st.subheader("🏆 Classement des passages observables")
 
-                df_observable_display = df_observable_display.copy()
-                df_observable_display.index = np.arange(1, len(df_observable_display) + 1)
-                df_observable_display.index.name = 'Rang'
-
+                # Index 'Rang' (1..N) déjà posé par process_passes : pas de copie ici
                 # Top 10
-                df_top_10 = df_observable_display.iloc[0:10]
+                df_top_10 = st.session_state['df_top_10']
                 st.caption(
                     "🥇 **Top 10 des passages optimaux** (Rang 1 à 10) : "
                     "Meilleure combinaison de visibilité (ISS, Ciel) et de durée."
@@ -832,7 +1074,7 @@ def main():
 
                 # Top 11-20
                 if total_observable_count > 10:
-                    df_next_10 = df_observable_display.iloc[10:20]
+                    df_next_10 = st.session_state['df_next_10']
                     st.caption("🥈 **Options suivantes** (Rang 11 à 20)")
                     st.dataframe(df_next_10, use_container_width=True, column_config=DATAFRAME_COLUMN_CONFIG)
 
@@ -846,84 +1088,11 @@ def main():
             st.divider()
 
             # --- GRAPHIQUE CHRONOLOGIQUE UNIQUE AVEC CONTAINER ---
-            df_chart_data = st.session_state.get('df_sorted')
+            # Colonnes dérivées déjà calculées lors de la prédiction (voir prepare_chart_data)
+            df_chart_data = st.session_state.get('df_chart_ready')
 
             if df_chart_data is not None and not df_chart_data.empty:
-                df_chart_data = df_chart_data.copy()
-                df_chart_data['Heure du Jour (Décimale)'] = (
-                    df_chart_data['Date Heure du Passage (UTC)'].dt.hour
-                    + df_chart_data['Date Heure du Passage (UTC)'].dt.minute / 60
-                )
-                df_chart_data['Date'] = df_chart_data['Date Heure du Passage (UTC)'].dt.date
-                df_chart_data['Durée (Min)'] = df_chart_data['Durée (Secondes)'] / 60
-                df_chart_data['Label Passage'] = df_chart_data['Durée (Secondes)'].apply(
-                    lambda x: f"Durée: {x // 60}m {x % 60}s"
-                )
-                df_chart_data['Symbole Moment'] = df_chart_data['Moment Sol/Ciel'].apply(get_symbol_display)
-                df_chart_data['rank'] = df_chart_data.index + 1
-
-                # Création graphique de base
-                fig_time_of_day = px.scatter(
-                    df_chart_data,
-                    x='Date',
-                    y='Heure du Jour (Décimale)',
-                    color='Symbole Moment',
-                    size='Durée (Min)',
-                    hover_name='Label Passage',
-                    labels={'Date': 'Jour', 'Heure du Jour (Décimale)': 'Heure (UTC)'},
-                    color_discrete_map={
-                        "🌅 Aube": "#FFC107",
-                        "🌇 Crépuscule": "#FF5722",
-                        "☀️ Jour": "#42A5F5",
-                        "🌑 Nuit Profonde": "#414040"
-                    },
-                    title="Répartition des passages par jour et par heure dans la journée"
-                )
-
-                # Top10 rouge
-                df_top10 = df_chart_data[df_chart_data['rank'] <= 10]
-                fig_time_of_day.add_trace(px_go.Scatter(
-                    x=df_top10['Date'],
-                    y=df_top10['Heure du Jour (Décimale)'],
-                    mode='markers',
-                    name='Top 10 (Optimal)',
-                    marker=dict(color='red', size=df_top10['Durée (Min)']*2.5+10, symbol='circle-open', line=dict(width=3)),
-                    customdata=df_top10[['rank', 'Durée (Min)']],
-                    hovertemplate='<b>🥇 Rang:</b> %{customdata[0]}<br><b>Durée:</b> %{customdata[1]:.1f} min<extra></extra>'
-                ))
-
-                # Top11-20 vert
-                df_mid = df_chart_data[(df_chart_data['rank'] > 10) & (df_chart_data['rank'] <= 20)]
-                fig_time_of_day.add_trace(px_go.Scatter(
-                    x=df_mid['Date'],
-                    y=df_mid['Heure du Jour (Décimale)'],
-                    mode='markers',
-                    name='Top 11-20 (Satisfaisant)',
-                    marker=dict(color='green', size=df_mid['Durée (Min)']*2+8, symbol='circle-open', line=dict(width=2)),
-                    customdata=df_mid[['rank', 'Durée (Min)']],
-                    hovertemplate='<b>🥈 Rang:</b> %{customdata[0]}<br><b>Durée:</b> %{customdata[1]:.1f} min<extra></extra>'
-                ))
-
-                # Mise à jour des axes et layout
-                fig_time_of_day.update_yaxes(
-                    tickvals=list(range(25)),
-                    ticktext=[f"{h:02d}:00" for h in range(25)],
-                    range=[-1, 25],
-                    title="Heure (UTC)"
-                )
-                fig_time_of_day.update_xaxes(
-                    tickangle=45,
-                    dtick="D1",
-                    tickformat="%d %b"
-                )
-                fig_time_of_day.update_layout(
-                    height=600,
-                    legend_title_text='Légende',
-                    margin=dict(l=10, r=10, t=50, b=10),
-                    yaxis=dict(showgrid=True, gridcolor='lightgray'),
-                    xaxis=dict(showgrid=True, gridcolor='lightgray'),
-                    showlegend=True
-                )
+                fig_time_of_day = build_time_of_day_figure(df_chart_data)
 
                 # Affichage du graphique à l'intérieur du container
                 with st.container(border=True):